@@ -2,20 +2,27 @@ r"""
 Veering triangulations endowed with a flat structure.
 """
 
+from six import integer_types
+
 from sage.structure.sequence import Sequence
-from sage.categories.fields import Fields
 from sage.rings.all import ZZ, QQ, AA, RDF, NumberField
+from sage.rings.integer import Integer
+from sage.rings.rational import Rational
 from sage.rings.polynomial.polynomial_ring_constructor import PolynomialRing
 from sage.modules.free_module import VectorSpace
 from sage.modules.free_module_element import vector
 
+from . import env
 from .constants import BLUE, RED, PURPLE, GREEN, LEFT, RIGHT
 from .permutation import perm_cycles, perm_check, perm_init, perm_conjugate, perm_on_list
 from .triangulation import Triangulation
 from .veering_triangulation import VeeringTriangulation
-from .misc import flipper_edge, flipper_edge_perm, flipper_nf_to_sage, flipper_nf_element_to_sage, det2, flipper_face_edge_perms
+from .misc import flipper_edge_perm, flipper_nf_to_sage, flipper_nf_element_to_sage, flipper_face_edge_perms
+
+_RATIONAL_TYPES = integer_types + (Integer, Rational)
 
-_Fields = Fields()
+def _is_rational_pair(v):
+    return len(v) == 2 and isinstance(v[0], _RATIONAL_TYPES) and isinstance(v[1], _RATIONAL_TYPES)
 
 def vec_slope(v):
     r"""
@@ -35,11 +42,14 @@ def vec_slope(v):
         sage: vec_slope((1,-1)) == vec_slope((1,-1)) == BLUE
         True
     """
-    if v[0].is_zero():
+    x, y = v
+    if x.is_zero():
         return GREEN
-    elif v[1].is_zero():
+    elif y.is_zero():
         return PURPLE
-    elif v[0] * v[1] > 0:
+    elif (x > 0) == (y > 0):
+        # both coordinates are nonzero: compare signs rather than
+        # computing the product
         return RED
     else:
         return BLUE
@@ -77,8 +87,42 @@ class FlatVeeringTriangulation(Triangulation):
         sage: vecs = [-vecs[0], -vecs[1], -vecs[2], vecs[3], vecs[4], vecs[5]]
         sage: FlatVeeringTriangulation(fp, vecs)
         FlatVeeringTriangulation(Triangulation("(0,1,2)(~2,~0,~1)"), [(1, 2), (-2, -1), (1, -1), (-1, 1), (2, 1), (-1, -2)])
+
+    The same holds in presence of vertical edges::
+
+        sage: from veerer.constants import GREEN
+        sage: vecs = [(0, 2), (-1, -1), (1, -1), (1, -1), (-1, -1), (0, 2)]
+        sage: F = FlatVeeringTriangulation(fp, vecs)
+        sage: F
+        FlatVeeringTriangulation(Triangulation("(0,1,2)(~2,~0,~1)"), [(0, 2), (-1, -1), (1, -1), (-1, 1), (1, 1), (0, -2)])
+        sage: F.edge_colour(0) == GREEN
+        True
+        sage: all(F._holonomies[e] == -F._holonomies[F._ep[e]] for e in range(6))
+        True
+        sage: F._check()
+
+    The Abelian test can be skipped with ``translation=False``. The surface is
+    then considered as a half-translation surface and the holonomies are kept
+    as given (compare with the normalized holonomies above). The only other
+    accepted value is the default ``None`` which runs the test. Note that
+    :meth:`copy` never runs this test::
+
+        sage: vecs = [(1, 2), (-2, -1), (1, -1), (1, -1), (-2, -1), (1, 2)]
+        sage: F = FlatVeeringTriangulation(fp, vecs, translation=False)
+        sage: F
+        FlatVeeringTriangulation(Triangulation("(0,1,2)(~2,~0,~1)"), [(1, 2), (-2, -1), (1, -1), (1, -1), (-2, -1), (1, 2)])
+        sage: F._translation
+        False
+        sage: FlatVeeringTriangulation(fp, vecs)._translation
+        True
+        sage: FlatVeeringTriangulation(fp, vecs, translation=True)
+        Traceback (most recent call last):
+        ...
+        ValueError: translation must be None or False
     """
-    def __init__(self, triangulation, holonomies=None, base_ring=None, check=True):
+    def __init__(self, triangulation, holonomies=None, base_ring=None, check=True, translation=None):
+        if translation is not None and translation is not False:
+            raise ValueError('translation must be None or False')
         Triangulation.__init__(self, triangulation, check=False)
         if isinstance(triangulation, FlatVeeringTriangulation):
             self._holonomies = triangulation._holonomies[:]
@@ -86,8 +130,17 @@ class FlatVeeringTriangulation(Triangulation):
             self._V = triangulation._V
             self._K = triangulation._K
             self._translation = triangulation._translation
+            self._veering_cache = triangulation._veering_cache
+            self._faces_cache = triangulation._faces_cache
             return
 
+        self._faces_cache = None
+
+        if base_ring is None and isinstance(holonomies, (tuple, list)) and \
+           all(_is_rational_pair(v) for v in holonomies):
+            # rational coordinates: no need to infer a common parent
+            base_ring = QQ
+
         if base_ring is None:
             S = Sequence([vector(v) for v in holonomies])
             self._V = S.universe()
@@ -98,7 +151,7 @@ class FlatVeeringTriangulation(Triangulation):
             self._V = VectorSpace(self._K, 2)
             holonomies = [self._V(v) for v in holonomies]
 
-        if self._K not in _Fields:
+        if not self._K.is_field():
             self._K = self._K.fraction_field()
             self._V = self._V.change_ring(self._K)
             holonomies = [v.change_ring(self._K) for v in holonomies]
@@ -117,32 +170,41 @@ class FlatVeeringTriangulation(Triangulation):
             raise ValueError('wrong number of vectors')
         self._holonomies = holonomies
 
-        cols = [vec_slope(self._holonomies[e]) for e in range(n)]
+        # NOTE: the colours are computed once and shared between the
+        # compatibility check and the veering triangulation below
+        cols = [vec_slope(v) for v in holonomies]
         if isinstance(triangulation, VeeringTriangulation):
             # check that colours are compatible
+            tcols = triangulation._colouring
             for e in range(triangulation.num_edges()):
-                tcol = triangulation.edge_colour(e)
-                scol = self.edge_colour(e)
+                scol = cols[e]
                 if scol == PURPLE or scol == GREEN:
                     continue
-                if tcol != scol:
+                if tcols[e] != scol:
                     raise ValueError("incompatible colours")
 
-        V = self.to_veering_triangulation()
-        ans, cert = V.is_abelian(certificate=True)
+        # NOTE: the colours are invariant under the sign changes below so
+        # that V can be kept as the cached veering triangulation
+        V = self._veering_cache = VeeringTriangulation(self, cols)
+        if translation is False:
+            # known half-translation surface: skip the Abelian test
+            ans = False
+        else:
+            ans, cert = V.is_abelian(certificate=True)
         self._translation = False
         if ans:
             # translation surface (Abelian differential)
             # fix holonomies so that
             # holonomies[ep[e]] = - holonomies[e]
+            # The certificate gives an orientation for each half-edge: True
+            # if x > 0 or (x == 0 and y > 0). As it is already consistent
+            # along ep, a single pass over half-edges is enough.
             self._translation = True
-            ep = self._ep
+            hol = self._holonomies
             for e, right in enumerate(cert):
-                E = ep[e]
-                if right != (self._holonomies[e][0] > 0):
-                    self._holonomies[e] = -self._holonomies[e]
-                if right != (self._holonomies[E][0] < 0):
-                    self._holonomies[E] = -self._holonomies[E]
+                x, y = hol[e]
+                if right != (x > 0 or (x.is_zero() and y > 0)):
+                    hol[e] = -hol[e]
 
         if check:
             self._check()
@@ -166,13 +228,18 @@ class FlatVeeringTriangulation(Triangulation):
         r"""
         Apply a 180 degree rotation to the triangle containing the edge ``e``.
         """
+        hol = self._holonomies
         f = self._fp[e]
         g = self._fp[f]
-        self._holonomies[e] = -self._holonomies[e]
-        self._holonomies[f] = -self._holonomies[f]
-        self._holonomies[g] = -self._holonomies[g]
+        hol[e] = -hol[e]
+        hol[f] = -hol[f]
+        hol[g] = -hol[g]
 
-        self._check()
+        if env.CHECK:
+            self._check()
+        else:
+            # only the triangle (e, f, g) has been modified
+            self._check_faces([(e, f, g)])
 
     def colours_about_edge(self, e):
         e = int(e)
@@ -224,11 +291,31 @@ class FlatVeeringTriangulation(Triangulation):
     def swap(self, e):
         r"""
         Swap the orientation of the edge ``e``.
+
+        EXAMPLES::
+
+            sage: from veerer import FlatVeeringTriangulation
+            sage: F = FlatVeeringTriangulation("(0,1,2)(~0,~1,~2)", [(1, 2), (-2, -1), (1, -1)])
+            sage: F.to_veering_triangulation()
+            VeeringTriangulation("(0,1,2)(~2,~0,~1)", "RRB")
+            sage: F.swap(0)
+            sage: F
+            FlatVeeringTriangulation(Triangulation("(0,~1,~2)(1,2,~0)"), [(-1, -2), (-2, -1), (1, -1), (-1, 1), (2, 1), (1, 2)])
+            sage: F._check()
+            sage: F.to_veering_triangulation()
+            VeeringTriangulation("(0,~1,~2)(1,2,~0)", "RRB")
+            sage: F.swap(0)
+            sage: F
+            FlatVeeringTriangulation(Triangulation("(0,1,2)(~2,~0,~1)"), [(1, 2), (-2, -1), (1, -1), (-1, 1), (2, 1), (-1, -2)])
+            sage: F.to_veering_triangulation()
+            VeeringTriangulation("(0,1,2)(~2,~0,~1)", "RRB")
         """
         E = self._ep[e]
         if e != E:
-            Triangulation.swap(e)
             self._holonomies[e], self._holonomies[E] = self._holonomies[E], self._holonomies[e]
+            self._veering_cache = None
+            self._faces_cache = None
+            Triangulation.swap(self, e)
 
     def boshernitzan_criterion(self):
         r"""
@@ -294,23 +381,86 @@ class FlatVeeringTriangulation(Triangulation):
         K = flipper_nf_to_sage(x.field)
         V = VectorSpace(K, 2)
         # translate into Sage number field
-        Vec = {flipper_edge(Th,e): V((flipper_nf_element_to_sage(v.x, K),
-                               flipper_nf_element_to_sage(v.y, K)))
-                  for e,v in Fh.edge_vectors.items()}
-        vectors = [Vec[i] for i in range(n)]
+        vectors = [None] * n
+        for e, v in Fh.edge_vectors.items():
+            e = e.label
+            vectors[n * (e < 0) + e] = V((flipper_nf_element_to_sage(v.x, K),
+                                          flipper_nf_element_to_sage(v.y, K)))
 
         return FlatVeeringTriangulation(T, vectors, K)
 
     def to_veering_triangulation(self):
-        return VeeringTriangulation(self, [self.edge_colour(e) for e in range(self._n)])
+        r"""
+        Return the veering triangulation given by the slopes of the holonomies.
+
+        The veering triangulation is cached until this flat structure is
+        modified. A copy is returned.
+
+        EXAMPLES::
+
+            sage: from veerer import *
+            sage: T = VeeringTriangulation("(0,1,2)(~0,~1,3)", "BRBB")
+            sage: F = FlatVeeringTriangulation.from_coloured_triangulation(T)
+            sage: V = F.to_veering_triangulation()
+            sage: V == T
+            True
+            sage: V is F.to_veering_triangulation()
+            False
+        """
+        if self._veering_cache is None:
+            self._veering_cache = VeeringTriangulation(self, [vec_slope(v) for v in self._holonomies])
+        return self._veering_cache.copy()
 
     def to_pyflatsurf(self):
+        r"""
+        Return this translation surface as a pyflatsurf surface.
+
+        EXAMPLES::
+
+            sage: from veerer import FlatVeeringTriangulation, Triangulation
+            sage: F = FlatVeeringTriangulation("(0,1,2)(~0,~1,~2)", [(1, 2), (-2, -1), (1, -1)])
+            sage: S = F.to_pyflatsurf()  # optional - pyflatsurf
+            sage: len(S.vertices()), len(S.edges())  # optional - pyflatsurf
+            (1, 3)
+
+        The edge permutation must be in standard form::
+
+            sage: from array import array
+            sage: fp = array('l', [2, 3, 4, 5, 0, 1])
+            sage: ep = array('l', [1, 0, 3, 2, 5, 4])
+            sage: T = Triangulation.from_face_edge_perms(fp, ep)
+            sage: F = FlatVeeringTriangulation(T, [(1, 2), (-1, -2), (-2, -1), (2, 1), (1, -1), (-1, 1)])
+            sage: F.to_pyflatsurf()
+            Traceback (most recent call last):
+            ...
+            ValueError: edge perm not in standard form
+
+        Half-translation surfaces are not supported::
+
+            sage: T = Triangulation("(0,1,2)")
+            sage: F = FlatVeeringTriangulation(T, [(13, 8), (-21, -3), (8, -5)], translation=False)
+            sage: F.to_pyflatsurf()
+            Traceback (most recent call last):
+            ...
+            ValueError: pyflatsurf only works with translation surfaces
+        """
         if not self._translation:
             raise ValueError("pyflatsurf only works with translation surfaces")
+
+        # the holonomies of the edges are the ones of the half-edges
+        # 0, 1, ..., m-1 (standard form)
+        m = self.num_edges()
+        ep = self._ep
+        for e in range(m):
+            E = ep[e]
+            if e != E and E < m:
+                raise ValueError("edge perm not in standard form")
+
         from pyflatsurf.factory import make_surface
         from pyflatsurf.sage_conversion import make_vectors
-        verts = [(i+1 if i >=0 else i for i in c) for c in perm_cycles(self._vp, True, self._n)]
-        vectors = makeVectors(self._holonomies[e] for e in range(self.num_edges()))
+        # edges are labelled 1, 2, ..., m and the half-edge ~e is -(e+1)
+        verts = [tuple(e + 1 if e <= ep[e] else -ep[e] - 1 for e in c) for c in perm_cycles(self._vp, True, self._n)]
+        vectors = make_vectors(self._holonomies[:m])
         return make_surface(verts, vectors)
 
     def __str__(self):
@@ -333,35 +483,59 @@ class FlatVeeringTriangulation(Triangulation):
         Triangulation._check(self)
 
         n = self.num_half_edges()
-        ep = self.edge_permutation(copy=False)
         vectors = self._holonomies
         if len(vectors) != n:
             raise ValueError("invalid list of vectors")
 
-        for a in range(n):
-            A = ep[a]
-            u = vectors[a]
-            v = vectors[A]
-            if u != v and u != -v:
-                raise ValueError('ep[%s] = %s but vec[%s] = %s' % (a, u, A, v))
+        # each half-edge belongs to exactly one face so that a single pass
+        # over faces checks both the gluings and the triangles
+        self._check_faces(self._faces())
+
+    def _check_faces(self, faces):
+        r"""
+        Check the gluings and the holonomies of the given faces.
+
+        This is the part of :meth:`_check` that depends on the holonomies. It
+        is used to check only the faces modified by a flip.
 
-        for a,b,c in self.faces():
+        EXAMPLES::
+
+            sage: from veerer import *
+            sage: T = VeeringTriangulation("(0,1,2)(~0,~1,3)", "BRRR")
+            sage: F = T.flat_structure_min()
+            sage: F._check_faces([(0, 1, 2)])
+            sage: F._check_faces([(0, 2, 1)])
+            Traceback (most recent call last):
+            ...
+            ValueError: (0, 2, 1) is a clockwise triangle
+        """
+        ep = self._ep
+        vectors = self._holonomies
+        translation = self._translation
+        for a,b,c in faces:
             va = vectors[a]
             vb = vectors[b]
             vc = vectors[c]
+
+            for e, u in ((a, va), (b, vb), (c, vc)):
+                E = ep[e]
+                v = vectors[E]
+                if u != -v and (translation or u != v):
+                    raise ValueError('ep[%s] = %s but vec[%s] = %s' % (e, u, E, v))
+
             if va + vb + vc:
                 raise ValueError('vec[%s] = %s, vec[%s] = %s and vec[%s] = %s do not sum to zero' % (a, va, b, vb, c, vc))
 
-            if det2(va, vb) <= 0 or det2(vb, vc) <= 0 or det2(vc, va) <= 0:
+            # NOTE: as va + vb + vc = 0 the three determinants
+            # det2(va, vb), det2(vb, vc) and det2(vc, va) are equal
+            xa, ya = va
+            xb, yb = vb
+            if xa * yb - ya * xb <= 0:
                 raise ValueError('(%s, %s, %s) is a clockwise triangle' %
                         (a, b, c))
 
-        if self._translation:
-            for e in range(self.num_edges()):
-                E = ep[e]
-                assert self._holonomies[e] == -self._holonomies[E]
-
     def copy(self):
+        # NOTE: bypass __init__ so that the Abelian test is not redone
         res = FlatVeeringTriangulation.__new__(FlatVeeringTriangulation)
         res._n = self._n
         res._vp = self._vp[:]
@@ -369,11 +543,38 @@ class FlatVeeringTriangulation(Triangulation):
         res._fp = self._fp[:]
         res._V = self._V
         res._K = self._K
-        res._holonomies = [v.__copy__() for v in self._holonomies]
+        # NOTE: the holonomy vectors are shared with the copy. They are never
+        # modified inplace: the entries of _holonomies are replaced instead.
+        res._holonomies = self._holonomies[:]
         res._translation = self._translation
+        res._veering_cache = self._veering_cache
+        res._faces_cache = self._faces_cache
         return res
 
+    def _faces(self):
+        r"""
+        Return the faces as a list of triples of half-edges.
+
+        Contrarily to :meth:`faces` the list is cached until the next
+        combinatorial modification and must not be modified.
+
+        EXAMPLES::
+
+            sage: from veerer import *
+            sage: T = VeeringTriangulation("(0,1,2)(~0,~1,3)", "BRBB")
+            sage: F = FlatVeeringTriangulation.from_coloured_triangulation(T)
+            sage: F._faces()
+            [(0, 1, 2), (3, 5, 4)]
+            sage: F._faces() is F._faces()
+            True
+        """
+        if self._faces_cache is None:
+            self._faces_cache = [tuple(f) for f in self.faces()]
+        return self._faces_cache
+
     def edge_colour(self, e):
+        if self._veering_cache is not None:
+            return self._veering_cache._colouring[e]
         return vec_slope(self._holonomies[e])
 
     def layout(self):
@@ -394,11 +595,11 @@ class FlatVeeringTriangulation(Triangulation):
             Graphics object consisting of 15 graphics primitives
 
             sage: F.plot(horizontal_train_track=True)  # not tested (matplotlib warning)
-            Graphics object consisting of 19 graphics primitives
+            Graphics object consisting of 17 graphics primitives
             sage: F.plot(vertical_train_track=True)  # not tested (matplotlib warning)
-            Graphics object consisting of 19 graphics primitives
+            Graphics object consisting of 17 graphics primitives
             sage: F.plot(horizontal_train_track=True, vertical_train_track=True)  # not tested (matplotlib warning)
-            Graphics object consisting of 23 graphics primitives
+            Graphics object consisting of 19 graphics primitives
         """
         return self.layout().plot(*args, **kwds)
 
@@ -430,6 +631,8 @@ class FlatVeeringTriangulation(Triangulation):
         if not self.is_forward_flippable(e):
             raise ValueError
 
+        fp = self._fp
+        hol = self._holonomies
         E = self._ep[e]
         if e == E:
             # folded edge: two possible choices
@@ -445,37 +648,49 @@ class FlatVeeringTriangulation(Triangulation):
             #    \   b/                \  |      | b/
             #     \  /                  \ |      | /
             #                         LEFT        RIGHT
-            a = self._fp[e]
-            b = self._fp[a]
+            a = fp[e]
+            b = fp[a]
 
             if folded_edge_convention == RIGHT:
-                self._holonomies[a] = -self._holonomies[a]
+                hol[a] = -hol[a]
             elif folded_edge_convention == LEFT:
-                self._holonomies[b] = -self._holonomies[b]
+                hol[b] = -hol[b]
             else:
                 raise ValueError('folded_edge_convention must be RIGHT (={}) or LEFT (={})'.format(RIGHT, LEFT))
 
-            self._holonomies[e] = -(self._holonomies[a] + self._holonomies[b])
+            hol[e] = -(hol[a] + hol[b])
             Triangulation.flip(self, e)
+            self._veering_cache = None
+            self._faces_cache = None
 
         else:
-            if self._holonomies[e] == self._holonomies[E]:
+            if hol[e] == hol[E]:
                 # Make it so that e is well oriented
                 self.triangle_upside_down(e)
-            assert self._holonomies[e] == -self._holonomies[E]
+            assert hol[e] == -hol[E]
 
-            a = self._fp[e]
-            b = self._fp[a]
-            c = self._fp[E]
-            d = self._fp[c]
+            a = fp[e]
+            b = fp[a]
+            c = fp[E]
+            d = fp[c]
 
-            assert self._holonomies[d] + self._holonomies[a] + self._holonomies[b] + self._holonomies[c] == 0
+            assert hol[d] + hol[a] + hol[b] + hol[c] == 0
 
+            # NOTE: Triangulation.flip modifies fp inplace
             Triangulation.flip(self, e)
-            self._holonomies[e] = self._holonomies[d] + self._holonomies[a]
-            self._holonomies[E] = -self._holonomies[e]
+            hol[e] = hol[d] + hol[a]
+            hol[E] = -hol[e]
+            self._veering_cache = None
+            self._faces_cache = None
 
-        self._check()
+        if env.CHECK:
+            self._check()
+        else:
+            # only the faces on both sides of e have been modified
+            faces = [(e, fp[e], fp[fp[e]])]
+            if e != E:
+                faces.append((E, fp[E], fp[fp[E]]))
+            self._check_faces(faces)
 
     def relabel(self, p):
         r"""
@@ -501,6 +716,8 @@ class FlatVeeringTriangulation(Triangulation):
         self._fp = perm_conjugate(self._fp, p)
 
         perm_on_list(p, self._holonomies)
+        self._veering_cache = None
+        self._faces_cache = None
 
         self._check()
 
@@ -518,3 +735,4 @@ class FlatVeeringTriangulation(Triangulation):
             FlatVeeringTriangulation(Triangulation("(0,1,2)(3,4,~0)(5,6,~1)"), [(-94, 17), (-54, -67/3), (148, 16/3), (44, 79/3), (-138, -28/3), (-122, -31/3), (68, -12), (54, 67/3), (94, -17)])
         """
         self._holonomies = [self._V((a*x, b*y)) for x,y in self._holonomies]
+        self._veering_cache = None
@@ -14,18 +14,17 @@ Note:
 
 import math
 import itertools
+from array import array
 
 from sage.structure.sequence import Sequence
 
-from sage.categories.fields import Fields
-
 from sage.rings.all import ZZ, QQ, AA, RDF, NumberField
 from sage.rings.polynomial.polynomial_ring_constructor import PolynomialRing
 
 from sage.modules.free_module import VectorSpace
 from sage.modules.free_module_element import vector
 
-from sage.misc.prandom import shuffle
+from sage.misc.prandom import shuffle, randrange
 from sage.plot.graphics import Graphics
 from sage.plot.line import line2d
 from sage.plot.polygon import polygon2d
@@ -33,15 +32,14 @@ from sage.plot.text import text
 from sage.plot.bezier_path import bezier_path
 from sage.plot.point import point2d
 
+from . import env
 from .constants import BLUE, RED, PURPLE, GREEN, HORIZONTAL, VERTICAL, RIGHT, LEFT
 from .permutation import perm_init, perm_check, perm_on_list
-from .misc import flipper_edge, flipper_edge_perm, flipper_nf_to_sage, flipper_nf_element_to_sage, det2, flipper_face_edge_perms
+from .misc import flipper_edge, flipper_edge_perm, flipper_nf_to_sage, flipper_nf_element_to_sage, flipper_face_edge_perms
 from .triangulation import Triangulation
 from .veering_triangulation import VeeringTriangulation
 from .flat_structure import FlatVeeringTriangulation
 
-_Fields = Fields()
-
 EDGE_COLORS = {
     BLUE: 'blue',
     RED: 'red',
@@ -63,18 +61,68 @@ TIKZ_FACE_COLORS = {
 
 from .flat_structure import vec_slope
 
+def orientation(p, q, r):
+    r"""
+    Return the orientation of the triangle ``(p, q, r)`` as ``1``
+    (counterclockwise), ``-1`` (clockwise) or ``0`` (degenerate).
+
+    EXAMPLES::
+
+        sage: from veerer.layout import orientation
+        sage: orientation((0,0), (1,0), (0,1))
+        1
+        sage: orientation((0,0), (0,1), (1,0))
+        -1
+        sage: orientation((0,0), (1,1), (2,2))
+        0
+    """
+    d = (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+    return (d > 0) - (d < 0)
+
 def has_intersection(triangles, new_triangle, pos):
     r"""
     Check whether ``new_triangle`` intersects one of the triangles in ``triangles``
     where the positions of the vertices have to be found in ``pos``.
+
+    The triangles are given as triples of half-edges. Triangles whose bounding
+    box is disjoint from the one of ``new_triangle`` are discarded before
+    testing their sides.
+
+    .. NOTE::
+
+        This function is not called anywhere in veerer. In particular
+        :meth:`FlatVeeringTriangulationLayout.set_pos` does not test for
+        overlapping triangles.
+
+    EXAMPLES::
+
+        sage: from veerer.layout import has_intersection
+        sage: pos = [(0,0), (1,0), (0,1), (2,2), (3,2), (2,3), (1/4,1/4), (2,1/4), (1/4,2)]
+        sage: pos = [vector(QQ, p) for p in pos]
+        sage: has_intersection([(0,1,2)], (3,4,5), pos)
+        False
+        sage: has_intersection([(0,1,2)], (6,7,8), pos)
+        True
     """
+    q = [pos[e] for e in new_triangle]
+    qxmin = min(v[0] for v in q)
+    qxmax = max(v[0] for v in q)
+    qymin = min(v[1] for v in q)
+    qymax = max(v[1] for v in q)
+
     for t in triangles:
+        p = [pos[e] for e in t]
+        if max(v[0] for v in p) < qxmin or min(v[0] for v in p) > qxmax or \
+           max(v[1] for v in p) < qymin or min(v[1] for v in p) > qymax:
+            # disjoint bounding boxes
+            continue
+
         for i in range(3):
-            p1 = t[i]
-            p2 = t[(i+1)%3]
+            p1 = p[i]
+            p2 = p[(i+1)%3]
             for j in range(3):
-                q1 = new_triangle[j]
-                q2 = new_triangle[(j+1)%3]
+                q1 = q[j]
+                q2 = q[(j+1)%3]
 
                 if (orientation(p1,p2,q1) != orientation(p1,p2,q2) and \
                     orientation(q1,q2,p1) != orientation(q1,q2,p2)):
@@ -121,9 +169,40 @@ class FlatVeeringTriangulationLayout(object):
 
         # for actual display.
         self._pos = pos     # vertex positions (list of length n)
+        self._reset_cache()
 
         self._check()
 
+    def _reset_cache(self):
+        r"""
+        Reset the data precomputed for plotting.
+
+        This method must be called whenever the positions or the holonomies
+        are modified.
+        """
+        self._pos_n = None  # positions as vectors over RDF
+        self._slopes = None # slopes of the half-edges (array)
+        self._boundary = None # whether half-edges are on the boundary (list)
+        self._labels = None # positions and angles of edge labels (list)
+
+    def _numerical_positions(self):
+        r"""
+        Return the list of positions as vectors over ``RDF``.
+
+        EXAMPLES::
+
+            sage: from veerer import *
+            sage: T = VeeringTriangulation("(0,1,2)(~0,~1,3)", "BRBB")
+            sage: F = FlatVeeringTriangulation.from_coloured_triangulation(T).layout()
+            sage: F.set_pos()
+            sage: F._numerical_positions()[0].parent()
+            Vector space of dimension 2 over Real Double Field
+        """
+        if self._pos_n is None:
+            V2 = VectorSpace(RDF, 2)
+            self._pos_n = [V2(p) for p in self._pos]
+        return self._pos_n
+
     def _check(self):
         r"""
         EXAMPLES::
@@ -135,62 +214,71 @@ class FlatVeeringTriangulationLayout(object):
             sage: F.set_pos()
             sage: F._check()
         """
+        # NOTE: gluings, triangle sums and orientations are checked by the
+        # flat triangulation itself
         self._triangulation._check()
+        if self._pos is not None:
+            self._check_pos(self._triangulation._faces())
 
-        n = self._triangulation.num_half_edges()
-        ep = self._triangulation.edge_permutation(copy=False)
+    def _check_pos(self, faces):
+        r"""
+        Check that the positions are consistent with the holonomies in the
+        given faces.
+        """
         vectors = self._triangulation._holonomies
-
-        for a in range(n):
-            A = ep[a]
-            u = vectors[a]
-            v = vectors[A]
-            if u != v and u != -v:
-                raise ValueError('ep[%s] = %s but vec[%s] = %s' % (a, u, A, v))
-
-        for a,b,c in self._triangulation.faces():
-            va = vectors[a]
-            vb = vectors[b]
-            vc = vectors[c]
-            if va + vb + vc:
-                raise ValueError('vec[%s] = %s, vec[%s] = %s and vec[%s] = %s do not sum to zero' % (a, va, b, vb, c, vc))
-
-            if det2(va, vb) <= 0 or det2(vb, vc) <= 0 or det2(vc, va) <= 0:
-                raise ValueError('(%s, %s, %s) is a clockwise triangle' %
-                        (a, b, c))
-
         pos = self._pos
-        if pos is not None:
-            for a,b,c in self._triangulation.faces():
-                if (pos[a] is not None and pos[b] is not None and pos[a] + vectors[a] != pos[b]) or \
-                    (pos[b] is not None and pos[c] is not None and pos[b] + vectors[b] != pos[c]) or \
-                    (pos[c] is not None and pos[a] is not None and pos[c] + vectors[c] != pos[a]):
-                    raise ValueError('pos[%s] = %s, pos[%s] = %s, pos[%s] = %s while vec[%s] = %s, vec[%s] = %s, vec[%s] = %s' % (
-                                   a, pos[a],
-                                   b, pos[b],
-                                   c, pos[c],
-                                   a, vectors[a],
-                                   b, vectors[b],
-                                   c, vectors[c]))
+        for a,b,c in faces:
+            if (pos[a] is not None and pos[b] is not None and pos[a] + vectors[a] != pos[b]) or \
+                (pos[b] is not None and pos[c] is not None and pos[b] + vectors[b] != pos[c]) or \
+                (pos[c] is not None and pos[a] is not None and pos[c] + vectors[c] != pos[a]):
+                raise ValueError('pos[%s] = %s, pos[%s] = %s, pos[%s] = %s while vec[%s] = %s, vec[%s] = %s, vec[%s] = %s' % (
+                               a, pos[a],
+                               b, pos[b],
+                               c, pos[c],
+                               a, vectors[a],
+                               b, vectors[b],
+                               c, vectors[c]))
 
     def copy(self):
         res = FlatVeeringTriangulationLayout.__new__(FlatVeeringTriangulationLayout)
         res._triangulation = self._triangulation.copy()
         if self._pos is not None:
-            res._pos = [v.__copy__() for v in self._pos]
+            res._pos = self._pos[:]
         else:
             res._pos = None
+        res._reset_cache()
         return res
 
     def xy_scaling(self, sx, sy):
         r"""
         Apply Teichmueller flow to actually see things.
         """
-        for i,v in enumerate(self._triangulation._holonomies):
-            self._triangulation._holonomies[i] = self._triangulation._V((sx*v[0], sy*v[1]))
+        self._triangulation.xy_scaling(sx, sy)
+        self._reset_cache()
+
+    def _edge_slopes(self):
+        r"""
+        Return the array of slopes of the half-edges.
+
+        EXAMPLES::
+
+            sage: from veerer import *
+            sage: T = VeeringTriangulation("(0,1,2)(~0,~1,3)", "BRBB")
+            sage: F = FlatVeeringTriangulation.from_coloured_triangulation(T).layout()
+            sage: list(F._edge_slopes()) == list(T._colouring)
+            True
+        """
+        if self._slopes is None:
+            T = self._triangulation
+            if T._veering_cache is not None:
+                # colours already computed when the flat structure was built
+                self._slopes = T._veering_cache._colouring[:]
+            else:
+                self._slopes = array('l', [vec_slope(v) for v in T._holonomies])
+        return self._slopes
 
     def _edge_slope(self, e):
-        return vec_slope(self._triangulation._holonomies[e])
+        return self._edge_slopes()[e]
 
     def __repr__(self):
         if self._pos is None:
@@ -200,26 +288,65 @@ class FlatVeeringTriangulationLayout(object):
             return 'FlatTriangulationLayout({}, {})'.format(
                     self._triangulation, self._pos)
 
+    def _edge_is_boundary_raw(self, e):
+        r"""
+        Test whether the edge ``e`` is on the boundary of the display without
+        using the cache of :meth:`_edge_is_boundary`.
+
+        This test is done in constant time and is used while the positions
+        are being built.
+        """
+        pos = self._pos
+        if pos is None:
+            return False
+        E = self._triangulation._ep[e]
+        vectors = self._triangulation._holonomies
+        p = pos[self._triangulation._fp[e]]
+        return p is None or pos[E] is None or p != pos[E] or vectors[e] != -vectors[E]
+
     def _edge_is_boundary(self, e):
         r"""
         Test whether the edge ``e`` is on the boundary of the display.
+
+        EXAMPLES::
+
+            sage: from veerer import *
+            sage: T = VeeringTriangulation("(0,1,2)(~0,~1,3)", "BRBB")
+            sage: F = FlatVeeringTriangulation.from_coloured_triangulation(T).layout()
+            sage: F.set_pos()
+            sage: all(F._edge_is_boundary(e) == F._edge_is_boundary_raw(e) for e in range(6))
+            True
+            sage: sum(F._edge_is_boundary(e) for e in range(6))
+            4
         """
         if self._pos is None:
             return False
-        fp = self._triangulation.face_permutation(copy=False)
-        ep = self._triangulation.edge_permutation(copy=False)
-        pos = self._pos
-        vectors = self._triangulation._holonomies
-        E = ep[e]
-        return pos[fp[e]] is None or pos[E] is None or pos[fp[e]] != pos[E] or vectors[e] != -vectors[E]
+        if self._boundary is None:
+            ep = self._triangulation._ep
+            boundary = self._boundary = [True] * len(self._pos)
+            for f in range(len(boundary)):
+                F = ep[f]
+                if F < f:
+                    # the condition is symmetric in f and F
+                    boundary[f] = boundary[F]
+                else:
+                    boundary[f] = self._edge_is_boundary_raw(f)
+        return self._boundary[e]
 
     # there is something wrong with edge gluing
     # sometimes we end up with non-valid positions...
-    def glue_edge(self, e):
+    def glue_edge(self, e, check=True):
         r"""
         Glue the triangle accross the edge ``e`` to ``E`` so that
         we have a quadrilateral around ``e``.
 
+        INPUT:
+
+        - ``e`` - a half-edge
+
+        - ``check`` - boolean (default ``True``) - whether to check the layout
+          after the gluing
+
         TESTS::
 
             sage: from veerer import *
@@ -245,11 +372,12 @@ class FlatVeeringTriangulationLayout(object):
 
         if a != e and holonomies[a] == holonomies[e]:
             # apply point-symmetry to the triangle (a,b,c)
-            holonomies[a] *= -1
-            holonomies[b] *= -1
-            holonomies[c] *= -1
+            holonomies[a] = -holonomies[a]
+            holonomies[b] = -holonomies[b]
+            holonomies[c] = -holonomies[c]
+            self._reset_cache()
 
-        if self._edge_is_boundary(e):
+        if self._edge_is_boundary_raw(e):
             pos = self._pos
             if pos is None or pos[e] is None:
                 raise RuntimeError
@@ -258,13 +386,14 @@ class FlatVeeringTriangulationLayout(object):
                 pos[a] = pos[e] + holonomies[e]
             pos[b] = pos[a] + holonomies[a]
             pos[c] = pos[b] + holonomies[b]
-            xmin = min(pos[a][0], pos[b][0], pos[c][0])
-            xmax = max(pos[a][0], pos[b][0], pos[c][0])
-            ymin = min(pos[a][1], pos[b][1], pos[c][1])
-            ymax = max(pos[a][1], pos[b][1], pos[c][1])
+            self._reset_cache()
+            xa, ya = pos[a]
+            xb, yb = pos[b]
+            xc, yc = pos[c]
 
-            self._check()
-            return xmin, xmax, ymin, ymax
+            if check:
+                self._check()
+            return min(xa, xb, xc), max(xa, xb, xc), min(ya, yb, yc), max(ya, yb, yc)
 
     def sublayout(self, e):
         r"""
@@ -338,14 +467,21 @@ class FlatVeeringTriangulationLayout(object):
             s = 1
             t = pos[E] + holonomies[E] - pos[e]
 
-        for (a,b,c) in self.sublayout(e):
+        faces = self.sublayout(e)
+        for (a,b,c) in faces:
             if s == -1:
                 T.triangle_upside_down(a)
             pos[a] = s * pos[a] + t
             pos[b] = s * pos[b] + t
             pos[c] = s * pos[c] + t
+        self._reset_cache()
 
-        self._check()
+        if env.CHECK:
+            self._check()
+        else:
+            # only the triangles of the sublayout have been modified
+            T._check_faces(faces)
+            self._check_pos(faces)
 
     def set_pos_outgoing_separatrices(self, x_space=1):
         r"""
@@ -413,6 +549,7 @@ class FlatVeeringTriangulationLayout(object):
             x = x - xmin + xmax + x_space
 
         self._pos = pos
+        self._reset_cache()
 
     def set_pos(self, cylinders=None, y_space=0.1):
         r"""
@@ -438,13 +575,10 @@ class FlatVeeringTriangulationLayout(object):
         RBBBRBBRBBBR_64a5978301b2_ba9875643210
         """
         n = self._triangulation.num_half_edges()
-        half_edge_to_face = [None] * n
-        faces = self._triangulation.faces()
-
+        faces = self._triangulation._faces()
+        half_edge_to_face = array('l', [-1]) * n
         for i,(e0,e1,e2) in enumerate(faces):
-            half_edge_to_face[e0] = i
-            half_edge_to_face[e1] = i
-            half_edge_to_face[e2] = i
+            half_edge_to_face[e0] = half_edge_to_face[e1] = half_edge_to_face[e2] = i
 
         nf = self._triangulation.num_faces()
         face_seen = [False] * nf
@@ -452,13 +586,14 @@ class FlatVeeringTriangulationLayout(object):
         ep = self._triangulation.edge_permutation(copy=False)
         vectors = self._triangulation._holonomies
         pos = self._pos = [None] * (3*nf)
+        self._reset_cache()
 
         y = 0   # current height
 
         # set the cylinders
         if cylinders:
             for cyl,_,_,_ in cylinders:
-                xmin = xmax = ymin = ymax = self._K.zero()
+                xmin = xmax = ymin = ymax = self._triangulation._K.zero()
                 a = cyl[0]
                 pos[a] = self._triangulation._V((0,0))
 
@@ -466,7 +601,7 @@ class FlatVeeringTriangulationLayout(object):
                     cyl = cyl[:-1]
 
                 for e in cyl:
-                    x0min, x0max, y0min, y0max = self.glue_edge(e)
+                    x0min, x0max, y0min, y0max = self.glue_edge(e, check=False)
                     face_seen[half_edge_to_face[ep[e]]] = True
                     xmin = min(xmin, x0min)
                     xmax = max(xmax, x0max)
@@ -490,36 +625,45 @@ class FlatVeeringTriangulationLayout(object):
         n = self._triangulation.num_half_edges()
         for e in range(n):
             f = half_edge_to_face[e]
-            if (pos[e] is None) != (face_seen[half_edge_to_face[e]] is False):
+            if (pos[e] is None) != (face_seen[f] is False):
                 a,b,c = faces[f]
-                raise RuntimeError('cylinder badly set: pos[%s] = %s while its face (%s,%s,%s) is %s' % (e, self._pos[e], a, b, c, 'seen' if face_seen[half_edge_to_face[e]] else 'unseen'))
+                raise RuntimeError('cylinder badly set: pos[%s] = %s while its face (%s,%s,%s) is %s' % (e, self._pos[e], a, b, c, 'seen' if face_seen[f] else 'unseen'))
 
         # random forest
-        while any(x is False for x in face_seen):
-            # choose a starting face
-            for start in range(nf):
-                if face_seen[start] is False:
-                    break
+        n_unseen = face_seen.count(False)
+        start = 0
+        while n_unseen:
+            # choose a starting face (faces before start are all seen)
+            while face_seen[start] is not False:
+                start += 1
 
             # sets its position
             a, b, c = faces[start]
             pos[a] = self._triangulation._V.zero()
             pos[b] = pos[a] + vectors[a]
             pos[c] = pos[b] + vectors[b]
-            xmin = xmax = ymin = ymax = 0
-            xmin = min(xmin, pos[a][0], pos[b][0], pos[c][0])
-            xmax = max(xmax, pos[a][0], pos[b][0], pos[c][0])
-            ymin = min(ymin, pos[a][1], pos[b][1], pos[c][1])
-            ymax = max(ymax, pos[a][1], pos[b][1], pos[c][1])
+            xb, yb = pos[b]
+            xc, yc = pos[c]
+            xmin = min(0, xb, xc)
+            xmax = max(0, xb, xc)
+            ymin = min(0, yb, yc)
+            ymax = max(0, yb, yc)
 
             # spanning tree
             edges = {t:[] for t in range(nf)}
             wait = [start]
             face_seen[start] = True
+            n_unseen -= 1
             q = [start]
             while wait:
-                shuffle(wait)
-                t = wait.pop()
+                # pick a random face in wait (no need to shuffle it all)
+                if len(wait) == 1:
+                    t = wait.pop()
+                else:
+                    i = randrange(len(wait))
+                    t = wait[i]
+                    wait[i] = wait[-1]
+                    wait.pop()
                 t_edges = list(faces[t])
                 shuffle(t_edges)
                 for e in t_edges:
@@ -530,10 +674,11 @@ class FlatVeeringTriangulationLayout(object):
                     if face_seen[f] is False:
                         edges[t].append(e)
                         face_seen[f] = True
+                        n_unseen -= 1
                         q.append(f)
                         wait.append(f)
 
-                        x0min, x0max, y0min, y0max = self.glue_edge(e)
+                        x0min, x0max, y0min, y0max = self.glue_edge(e, check=False)
                         xmin = min(xmin, x0min)
                         xmax = max(xmax, x0max)
                         ymin = min(ymin, y0min)
@@ -557,6 +702,11 @@ class FlatVeeringTriangulationLayout(object):
             if self._pos[e] is None:
                 raise RuntimeError('pos[%s] not set properly' % e)
 
+        self._reset_cache()
+
+        # the gluings above are not checked one by one
+        self._check()
+
     def relabel(self, p):
         r"""
         Relabel according to the permutation ``p``.
@@ -580,6 +730,7 @@ class FlatVeeringTriangulationLayout(object):
         self._triangulation.relabel(p)
         if self._pos is not None:
             perm_on_list(p, self._pos)
+        self._reset_cache()
 
     def forward_flippable_edges(self):
         return self._triangulation.forward_flippable_edges()
@@ -691,7 +842,19 @@ class FlatVeeringTriangulationLayout(object):
                 pos[e] = pos[d]
                 pos[E] = pos[b]
 
-        self._check()
+        self._reset_cache()
+
+        if env.CHECK:
+            self._check()
+        elif pos is not None:
+            # only the positions in the faces on both sides of e have been
+            # modified (the holonomies are checked by the flat triangulation
+            # and the sublayout moved in the folded case by glue_subsurface)
+            fp = self._triangulation._fp
+            faces = [(e, fp[e], fp[fp[e]])]
+            if e != E:
+                faces.append((E, fp[E], fp[fp[E]]))
+            self._check_pos(faces)
 
     ###################################################################
     # Plotting functions
@@ -703,8 +866,7 @@ class FlatVeeringTriangulationLayout(object):
         """
         assert self._pos is not None
 
-        pos = self._pos
-        vectors = self._triangulation._holonomies
+        pos = self._numerical_positions()
         fp = self._triangulation._fp
         ep = self._triangulation._ep
 
@@ -769,30 +931,62 @@ class FlatVeeringTriangulationLayout(object):
             output.write('\\draw mid +(.1,.1) -- (-.1,-.1);\n')
             output.write('\\draw mid +(-.1,.1) -- (.1,-.1);\n')
 
-    def _plot_edge_label(self, a, tilde=None, **opts):
-        assert self._pos is not None
+    def _edge_label_positions(self):
+        r"""
+        Return the list of pairs ``(position, angle)`` where the labels of the
+        half-edges are drawn.
 
-        fp = self._triangulation.face_permutation(copy=False)
-        ep = self._triangulation.edge_permutation(copy=False)
-        pos = self._pos
-        vectors = self._triangulation._holonomies
+        EXAMPLES::
 
-        b = fp[a]
-        c = fp[b]
+            sage: from veerer import *
+            sage: T = VeeringTriangulation("(0,1,2)(~0,~1,3)", "BRBB")
+            sage: F = FlatVeeringTriangulation.from_coloured_triangulation(T).layout()
+            sage: F.set_pos()
+            sage: len(F._edge_label_positions()) == T.num_half_edges()
+            True
+        """
+        if self._labels is None:
+            fp = self._triangulation._fp
+            ep = self._triangulation._ep
+            vectors = self._triangulation._holonomies
+            posn = self._numerical_positions()
+
+            labels = self._labels = []
+            for a in range(len(posn)):
+                b = fp[a]
+                c = fp[b]
 
-        posa = pos[a].n()
-        posb = pos[b].n()
-        vc = vectors[c].n()
-        vc /= vc.norm()
-        relposc = posa - vc
+                posa = posn[a]
+                posb = posn[b]
+                vc = vectors[c].n()
+                vc /= vc.norm()
+                relposc = posa - vc
 
-        if a == ep[a]:
-            # folded edge
-            pos = (6.5 * posa + 6.5 * posb + relposc) / 14
-        else:
-            pos = (8 * posa + 5 * posb + relposc) / 14
+                if a == ep[a]:
+                    # folded edge
+                    pos = (6.5 * posa + 6.5 * posb + relposc) / 14
+                else:
+                    pos = (8 * posa + 5 * posb + relposc) / 14
+
+                x, y = vectors[a]
+                if y.is_zero():
+                    angle = 0
+                elif x.is_zero():
+                    if y > 0:
+                        angle = 90
+                    else:
+                        angle = 270
+                else:
+                    angle = math.degrees(math.atan2(float(y), float(x)))
+
+                labels.append((pos, angle))
 
+        return self._labels
 
+    def _plot_edge_label(self, a, tilde=None, **opts):
+        assert self._pos is not None
+
+        ep = self._triangulation._ep
 
         if tilde is None:
             tilde = self._edge_is_boundary(a)
@@ -805,22 +999,7 @@ class FlatVeeringTriangulationLayout(object):
         else:
             lab = str(a)
 
-        x, y = self._triangulation._holonomies[a]
-        if y.is_zero():
-            angle=0
-        elif x.is_zero():
-            if y > 0:
-                angle = 90
-            else:
-                angle = 270
-        else:
-            x = float(x)
-            y = float(y)
-            angle = math.acos(x / math.sqrt(x**2 + y**2))
-            if y < 0:
-                angle *= -1.0
-            angle *= 180 / math.pi
-
+        pos, angle = self._edge_label_positions()[a]
         return text(lab, pos, rotation=angle, color='black')
 
     def _plot_face(self, a, edge_labels=True, fill=True):
@@ -829,7 +1008,7 @@ class FlatVeeringTriangulationLayout(object):
         """
         assert self._pos is not None
 
-        fp = self._triangulation.face_permutation(copy=False)
+        fp = self._triangulation._fp
         b = fp[a]
         c = fp[b]
 
@@ -837,15 +1016,14 @@ class FlatVeeringTriangulationLayout(object):
 
         if fill:
             # computing slopes in order to determine filling color
-            pos = self._pos
+            pos = self._numerical_positions()
 
-            nred = nblue = 0
-            for e in (a,b,c):
-                slope = self._edge_slope(e)
-                if slope == RED:
-                    nred += 1
-                elif slope == BLUE:
-                    nblue += 1
+            slopes = self._edge_slopes()
+            sa = slopes[a]
+            sb = slopes[b]
+            sc = slopes[c]
+            nred = (sa == RED) + (sb == RED) + (sc == RED)
+            nblue = (sa == BLUE) + (sb == BLUE) + (sc == BLUE)
 
             if nred == 2:
                 color = (.75, 0.5, 0.5)
@@ -867,19 +1045,18 @@ class FlatVeeringTriangulationLayout(object):
             red='red!20', blue='blue!20', neutral='gray!20', tikz_face_options=None):
         assert self._pos is not None
 
-        fp = self._triangulation.face_permutation(copy=False)
+        fp = self._triangulation._fp
         b = fp[a]
         c = fp[b]
         pos = self._pos
 
         # computing slopes in order to determine filling color
-        nred = nblue = 0
-        for e in (a,b,c):
-            slope = self._edge_slope(e)
-            if slope == RED:
-                nred += 1
-            elif slope == BLUE:
-                nblue += 1
+        slopes = self._edge_slopes()
+        sa = slopes[a]
+        sb = slopes[b]
+        sc = slopes[c]
+        nred = (sa == RED) + (sb == RED) + (sc == RED)
+        nblue = (sa == BLUE) + (sb == BLUE) + (sc == BLUE)
 
         if nred == 2:
             color = TIKZ_FACE_COLORS[RED]
@@ -895,10 +1072,8 @@ class FlatVeeringTriangulationLayout(object):
              pos[c][0], pos[c][1]))
 
     def _plot_train_track(self, slope):
-        pos = self._pos
-        vectors = self._triangulation._holonomies
+        pos = self._numerical_positions()
 
-        V2 = VectorSpace(RDF, 2)
         G = Graphics()
 
         if slope == HORIZONTAL:
@@ -910,14 +1085,12 @@ class FlatVeeringTriangulationLayout(object):
             NEG = RED
             color = 'green'
 
+        slopes = self._edge_slopes()
         for e0, e1, e2 in self._triangulation.faces():
             # determine the large edge
-            v0 = vectors[e0]
-            v1 = vectors[e1]
-            v2 = vectors[e2]
-            col0 = RED if v0[0] * v0[1] > 0 else BLUE
-            col1 = RED if v1[0] * v1[1] > 0 else BLUE
-            col2 = RED if v2[0] * v2[1] > 0 else BLUE
+            col0 = RED if slopes[e0] == RED else BLUE
+            col1 = RED if slopes[e1] == RED else BLUE
+            col2 = RED if slopes[e2] == RED else BLUE
             if col0 == POS and col1 == NEG:
                 # e2 is large
                 l,s1,s2 = e2,e0,e1
@@ -928,28 +1101,42 @@ class FlatVeeringTriangulationLayout(object):
                 # j is large
                 l,s1,s2 = e1,e2,e0
 
-            pl = V2(pos[l])
-            ps1 = V2(pos[s1])
-            ps2 = V2(pos[s2])
-
-            cl = (pl + ps1) / 2
-            vl = (ps1 - pl)
-            cs1 = (ps1 + ps2) / 2
-            vs1 = ps2 - ps1
-            cs2 = (ps2 + pl) / 2
-            vs2 = pl - ps2
-
-            ol = V2((-vl[1], vl[0]))
-            ol /= ol.norm()
-            os1 = V2((-vs1[1], vs1[0]))
-            os1 /= os1.norm()
-            os2 = V2((-vs2[1], vs2[0]))
-            os2 /= os2.norm()
-
-            G += bezier_path([[cl, cl + 0.3 * ol,
-                               cs1 + 0.3 * os1, cs1]], rgbcolor=color)
-            G += bezier_path([[cl, cl + 0.3 * ol,
-                               cs2 + 0.3 * os2, cs2]], rgbcolor=color)
+            plx, ply = pos[l]
+            ps1x, ps1y = pos[s1]
+            ps2x, ps2y = pos[s2]
+
+            # middle of the edges
+            clx = (plx + ps1x) / 2
+            cly = (ply + ps1y) / 2
+            cs1x = (ps1x + ps2x) / 2
+            cs1y = (ps1y + ps2y) / 2
+            cs2x = (ps2x + plx) / 2
+            cs2y = (ps2y + ply) / 2
+
+            # normals to the edges (scaled by 0.3)
+            vlx = ps1x - plx
+            vly = ps1y - ply
+            r = 0.3 / math.hypot(vlx, vly)
+            olx = -r * vly
+            oly = r * vlx
+            vs1x = ps2x - ps1x
+            vs1y = ps2y - ps1y
+            r = 0.3 / math.hypot(vs1x, vs1y)
+            os1x = -r * vs1y
+            os1y = r * vs1x
+            vs2x = plx - ps2x
+            vs2y = ply - ps2y
+            r = 0.3 / math.hypot(vs2x, vs2y)
+            os2x = -r * vs2y
+            os2y = r * vs2x
+
+            # a single path per face: from the middle of s1 to the middle of
+            # l and then to the middle of s2
+            G += bezier_path([[(cs1x, cs1y), (cs1x + os1x, cs1y + os1y),
+                               (clx + olx, cly + oly), (clx, cly)],
+                              [(clx + olx, cly + oly),
+                               (cs2x + os2x, cs2y + os2y), (cs2x, cs2y)]],
+                             rgbcolor=color)
         return G
 
     def _tikz_train_track(self, slope):
@@ -979,22 +1166,20 @@ class FlatVeeringTriangulationLayout(object):
             sage: FS.plot(fill=True)
             Graphics object consisting of 37 graphics primitives
             sage: FS.plot(horizontal_train_track=True)
-            Graphics object consisting of 49 graphics primitives
+            Graphics object consisting of 43 graphics primitives
             sage: FS.plot(vertical_train_track=True)
-            Graphics object consisting of 49 graphics primitives
+            Graphics object consisting of 43 graphics primitives
         """
         if self._pos is None:
             self.set_pos()
 
         G = Graphics()
         n = self._triangulation.num_half_edges()
-        fp = self._triangulation.face_permutation(copy=False)
-        ep = self._triangulation.edge_permutation(copy=False)
+        ep = self._triangulation._ep
 
-        # 1. plot faces
-        for e in range(n):
-            if e < fp[e] and e < fp[fp[e]]:
-                G += self._plot_face(e, edge_labels=edge_labels, fill=fill)
+        # 1. plot faces (each face starts with its smallest half-edge)
+        for e, _, _ in self._triangulation._faces():
+            G += self._plot_face(e, edge_labels=edge_labels, fill=fill)
 
         # 2. plot edges
         for e in range(n):
@@ -1022,8 +1207,8 @@ class FlatVeeringTriangulationLayout(object):
 
         G = Graphics()
         n = self._triangulation.num_half_edges()
-        fp = self._triangulation.face_permutation(copy=False)
-        ep = self._triangulation.edge_permutation(copy=False)
+        fp = self._triangulation._fp
+        ep = self._triangulation._ep
 
         # 1. plot faces
         for e in range(n):
@@ -1,11 +1,7 @@
-from sage.categories.fields import Fields
-
 from sage.structure.sequence import Sequence
 
 from .triangulation import Triangulation
 
-_Fields = Fields()
-
 class MeasuredTrainTrack(object):
     r"""
     Train-track endowed with a transverse measure.
@@ -35,8 +35,8 @@ def flipper_face_edge_perms(T):
     from .permutation import perm_init
     n = 3 * T.num_triangles # number of half edges
 
-    # extract triangulation
-    triangles = [(flipper_edge(T, e), flipper_edge(T, f), flipper_edge(T, g)) for e,f,g in T]
+    # extract triangulation (same conversion as flipper_edge with n computed once)
+    triangles = [tuple(n * (e.label < 0) + e.label for e in t) for t in T]
     return perm_init(triangles), flipper_edge_perm(n)
 
 def flipper_isometry_to_perm(isom, ep, inv=False):
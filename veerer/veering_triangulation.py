@@ -3017,7 +3017,7 @@ class VeeringTriangulation(Triangulation):
         m = self.num_edges()
         n = self.num_half_edges()
         ep = self._ep
-        vectors.extend(vectors[ep[e]] for e in range(m,n))
+        vectors.extend([vectors[ep[e]] for e in range(m,n)])
 
         # get correct signs for each triangle
         for i,j,k in self.faces():